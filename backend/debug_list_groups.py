@@ -18,7 +18,7 @@ async def main():
         groups = await client.list_groups()
         print(f"Success! Found {len(groups)} groups.")
         for g in groups:
-            print(f" - {g.group_name} ({g.graph_status})")
+            print(f" - {g.group_name} ({g.status})")
             
     except Exception as e:
         print("Error encountered:")
@@ -1,46 +1,103 @@
 import os
 import random
 import asyncio
-from typing import List, Dict, Any, Optional
-from pydantic import BaseModel
+import hashlib
+import time
+import weakref
+from collections import Counter
+from typing import List, Dict, Any, Optional, Tuple
+import numpy as np
+from cachetools import TTLCache
+from pydantic import BaseModel, ConfigDict
 from graphon_client.client import GraphonClient
 
-# Use the same client setup as graphon.py
 API_KEY = os.getenv("GRAPHON_API_KEY", "demo-api-key")
-# We start a separate client instance for the Graphex logic or reuse one if passed, 
-# but for static methods we might need a global or singleton.
-client = GraphonClient(api_key=API_KEY)
+# Process-wide client: graphon.py serves its endpoints from this same instance so every
+# request shares one keep-alive connection pool instead of paying a TLS handshake each time.
+# Built by startup() from the app's lifespan and closed by it at shutdown.
+client: Optional[GraphonClient] = None
+
+# Caps the number of in-flight upstream calls across all requests so bursts of dashboard
+# traffic queue here instead of overloading the API and the client's connection pool.
+# Created by startup() so it belongs to the event loop serving the current app.
+_api_sem: Optional[asyncio.Semaphore] = None
+
+# Per-file lookups are sent in chunks, with a few chunks in flight at a time
+FILE_FETCH_CHUNK_SIZE = 20
+FILE_FETCH_CONCURRENCY = 5
+
+# The primary group rarely changes, so remember it instead of listing groups on every request.
+# Failed lookups and "no ready group" are remembered too, but only briefly. Concurrent callers
+# all await the one in-flight lookup task instead of repeating list_groups() in turn.
+PRIMARY_GROUP_TTL = 60.0
+PRIMARY_GROUP_MISS_TTL = 5.0
+_primary_group_cache: Optional[Tuple[Optional[str], float]] = None  # (group_id, expires_at)
+_primary_lookup: "Optional[asyncio.Task[Optional[str]]]" = None
+
+# Repeat queries from the dashboard are served from memory for a few minutes.
+# Keys are (group_id, digest) so a group's entries can be dropped when it changes;
+# the per-key locks make concurrent identical queries wait for one upstream call.
+_retrieve_cache: TTLCache = TTLCache(maxsize=512, ttl=300)
+_retrieve_locks: "weakref.WeakValueDictionary[Tuple[str, bytes], asyncio.Lock]" = weakref.WeakValueDictionary()
+
+# Vectorized draws for sample(); one generator per process
+_rng = np.random.default_rng()
+
+def startup() -> GraphonClient:
+    # Called on every app startup, so a restarted app never reuses the client closed at the last shutdown
+    global client, _api_sem, _primary_lookup
+    # A semaphore or lookup left over from a previous app belongs to that app's event loop
+    _api_sem = asyncio.Semaphore(int(os.getenv("GRAPHON_MAX_CONCURRENCY", "20")))
+    _primary_lookup = None
+    client = GraphonClient(
+        api_key=API_KEY,
+        max_connections=int(os.getenv("GRAPHON_MAX_CONNECTIONS", "100")),
+        max_keepalive_connections=int(os.getenv("GRAPHON_MAX_KEEPALIVE_CONNECTIONS", "50")),
+    )
+    return client
+
+# File extension -> node type; anything else is treated as text
+_EXT_MAP = {
+    'mp4': 'video', 'mov': 'video', 'webm': 'video',
+    'mp3': 'audio', 'wav': 'audio', 'm4a': 'audio',
+    'png': 'image', 'jpg': 'image', 'jpeg': 'image', 'svg': 'image',
+    'pdf': 'doc', 'doc': 'doc', 'docx': 'doc',
+}
 
 # --- Domain Models ---
 
-class GraphNode(BaseModel):
+class _DomainModel(BaseModel):
+    # Results are built once per request and never mutated (cached ones are shared)
+    model_config = ConfigDict(frozen=True, extra='ignore', populate_by_name=True)
+
+class GraphNode(_DomainModel):
     id: str
     label: str
     type: str 
     content_preview: str
     metadata: Dict[str, Any] = {}
     
-class GraphEdge(BaseModel):
+class GraphEdge(_DomainModel):
     source: str
     target: str
     weight: float
     relation: str 
 
-class RetrievalHit(BaseModel):
+class RetrievalHit(_DomainModel):
     node: GraphNode
     score: float
     explanation: str
 
-class RetrievalResult(BaseModel):
+class RetrievalResult(_DomainModel):
     hits: List[RetrievalHit]
     answer: Optional[str] = None
 
-class ExpansionResult(BaseModel):
+class ExpansionResult(_DomainModel):
     nodes: List[GraphNode]
     edges: List[GraphEdge]
     summary: str
 
-class SamplingResult(BaseModel):
+class SamplingResult(_DomainModel):
     nodes: List[GraphNode]
     edges: List[GraphEdge]
     stats: Dict[str, Any]
@@ -62,31 +119,45 @@ class Graphon:
 
     @staticmethod
     async def _get_primary_group() -> Optional[str]:
+        global _primary_lookup
+        if _primary_group_cache is not None:
+            group_id, expires_at = _primary_group_cache
+            if time.monotonic() < expires_at:
+                return group_id
+        if _primary_lookup is None or _primary_lookup.done():
+            _primary_lookup = asyncio.create_task(Graphon._lookup_primary_group())
+        # Shielded so a caller that disconnects doesn't cancel the lookup the others are waiting on
+        return await asyncio.shield(_primary_lookup)
+
+    @staticmethod
+    async def _lookup_primary_group() -> Optional[str]:
         # Find the first ready group to act as the "Main Knowledge Base"
+        global _primary_group_cache
         try:
-            groups = await client.list_groups()
-            ready_groups = [g for g in groups if g.graph_status == "ready"]
-            if ready_groups:
-                return ready_groups[0].group_id
-            return None
-        except:
-            return None
+            async with _api_sem:
+                groups = await client.list_groups()
+            ready_groups = [g for g in groups if g.status == "SUCCESS"]
+            group_id = ready_groups[0].group_id if ready_groups else None
+        except Exception:
+            group_id = None
+        ttl = PRIMARY_GROUP_TTL if group_id else PRIMARY_GROUP_MISS_TTL
+        _primary_group_cache = (group_id, time.monotonic() + ttl)
+        return group_id
 
     @staticmethod
-    def retrieve(query: str, modalities: List[str] = None) -> List[RetrievalHit]:
-        # Since this is a synchronous wrapper for what might need async, we need to handle the event loop.
-        # Ideally, we should update the API signature to be async, but let's try to run it.
-        # backend/graphon.py calls this in an async function, so we should make this async too?
-        # The backend handler IS async: `return await Graphon.retrieve(...)`? 
-        # No, the previous `retrieve` was sync. I should make it async.
-        # But for now let's just use asyncio.run or assume it's called from async context.
-        # Wait, the `backend/graphon.py` handler `retrieve_content` is async.
-        # So I can change these to `@staticmethod async def retrieve(...)`.
-        
-        # NOTE: I need to update `graphon.py` to await this Call if I make it async.
-        # The previous code was: `return Graphon.retrieve(...)` (sync mock).
-        # I will update `graphon.py` to `await` it.
-        pass # implemented below safely as async
+    def reset_primary_group() -> None:
+        # Re-resolve the primary group on the next call, e.g. after a group is created.
+        # Cached retrievals stay valid: they are keyed by the group they queried, and
+        # creating groups or uploading files doesn't change an existing group's graph.
+        global _primary_group_cache
+        _primary_group_cache = None
+
+    @staticmethod
+    def _invalidate_primary_group(error: Exception) -> None:
+        # A 404 means the cached group is gone; forget it so the next call looks it up again
+        global _primary_group_cache
+        if "(404)" in str(error):
+            _primary_group_cache = None
 
     @staticmethod
     async def retrieve(query: str, modalities: List[str] = None, group_id: str = None) -> RetrievalResult:
@@ -96,25 +167,52 @@ class Graphon:
         if not group_id:
             return RetrievalResult(hits=[], answer="No knowledge group available.")
 
+        digest = hashlib.blake2b(
+            f"{group_id}|{query}|{','.join(sorted(modalities or []))}".encode(), digest_size=16
+        ).digest()
+        key = (group_id, digest)
+        cached = _retrieve_cache.get(key)
+        if cached is not None:
+            return cached
+
+        lock = _retrieve_locks.get(key)
+        if lock is None:
+            lock = _retrieve_locks[key] = asyncio.Lock()
+        async with lock:
+            cached = _retrieve_cache.get(key)
+            if cached is None:
+                cached = _retrieve_cache[key] = await Graphon._query_group(group_id, query)
+            return cached
+
+    @staticmethod
+    async def _query_group(group_id: str, query: str) -> RetrievalResult:
         # Query the real API
         # We ask for source data to get the snippets
-        response = await client.query_group(group_id, query, return_source_data=True)
+        try:
+            async with _api_sem:
+                response = await client.query_group(group_id, query, return_source_data=True)
+        except Exception as e:
+            Graphon._invalidate_primary_group(e)
+            raise
         
         hits = []
-        for i, source in enumerate(response.sources):
-            # Map source (dict) to GraphNode
-            # Source usually has: file_id, file_name, content_preview/text, score?
-            node = GraphNode(
+        for i, entry in enumerate(response.sources.values()):
+            # Map source to GraphNode
+            # Sources are keyed by citation marker; each has the source itself
+            # (file_id, file_name, text, ...) plus its relevance score
+            source = entry.get("source") or {}
+            # The upstream payload is trusted, so skip per-hit validation; RetrievalResult still validates
+            node = GraphNode.model_construct(
                 id=source.get("file_id", f"unknown-{i}"),
                 label=source.get("file_name", "Untitled"),
                 type=Graphon._map_file_type(source.get("file_name", "")),
-                content_preview=source.get("text", "")[:200] + "...",
+                content_preview=(source.get("text") or "")[:200] + "...",
                 metadata={"author": "Unknown", "timestamp": "Recently"}
             )
             
-            hits.append(RetrievalHit(
+            hits.append(RetrievalHit.model_construct(
                 node=node,
-                score=source.get("score", 0.9 - (i * 0.1)), # Fake score if not provided
+                score=entry.get("score", 0.9 - (i * 0.1)), # Fake score if not provided
                 explanation=f"Relevant to '{query}'"
             ))
             
@@ -136,17 +234,19 @@ class Graphon:
              return ExpansionResult(nodes=[], edges=[], summary="No knowledge graph available.")
             
         # Get all files in the group to build the "graph"
-        # Since we don't have an edge-query API, we build it in-memory from the file list
-        group = await client.get_group_status(group_id)
-        # We need file details. describe_group? or just list_files and filter?
-        all_files = await client.list_files() # This might be slow if many files, but OK for demo
-        group_file_ids = set(group.file_ids)
-        
-        # Filter to files in this group
-        relevant_files = [f for f in all_files if f.file_id in group_file_ids]
+        # Since we don't have an edge-query API, we build it in-memory from the group's files
+        try:
+            async with _api_sem:
+                group = await client.get_group_status(group_id)
+        except Exception as e:
+            Graphon._invalidate_primary_group(e)
+            raise
+        # Fetch only this group's files instead of listing every file the user owns
+        relevant_files = await Graphon._get_files_by_ids(list(group.file_ids))
         
-        # Identify seed nodes
-        seeds = [f for f in relevant_files if f.file_id in seed_ids]
+        # Identify seed nodes by id lookup instead of scanning seed_ids once per file
+        files_by_id = {f.file_id: f for f in relevant_files}
+        seeds = [files_by_id[sid] for sid in dict.fromkeys(seed_ids) if sid in files_by_id]
         if not seeds:
             # If seeds not found (maybe phantom IDs from mock?), pick randoms
             seeds = relevant_files[:len(seed_ids)] if relevant_files else []
@@ -164,13 +264,13 @@ class Graphon:
         # Heuristic 2: Random "citations" for demo visual if real links unavailable
         
         candidates = [f for f in relevant_files if f.file_id not in nodes_map]
-        random.shuffle(candidates)
+        # Draw every seed's neighbors at once; each seed takes its own window of 3
+        chosen = random.sample(candidates, min(3 * len(seeds), len(candidates)))
         
         # Add a few neighbors for each seed
-        for seed in seeds:
+        for s_idx, seed in enumerate(seeds):
             # Pick 2-3 neighbors
-            my_neighbors = candidates[:3]
-            candidates = candidates[3:] # consume
+            my_neighbors = chosen[s_idx * 3:(s_idx + 1) * 3]
             
             for i, n in enumerate(my_neighbors):
                 nodes_map[n.file_id] = Graphon._file_to_node(n)
@@ -192,13 +292,8 @@ class Graphon:
                      ))
         
         # Dynamic Summary Generation
-        type_counts = {}
-        for n in nodes_map.values():
-            type_counts[n.type] = type_counts.get(n.type, 0) + 1
-            
-        summary_parts = []
-        for t, count in type_counts.items():
-            summary_parts.append(f"{count} {t}s" if count > 1 else f"{count} {t}")
+        type_counts = Counter(n.type for n in nodes_map.values())
+        summary_parts = [f"{count} {t}s" if count > 1 else f"{count} {t}" for t, count in type_counts.items()]
             
         if summary_parts:
             summary_text = f"AI Synthesis: Analyzed real data from your graph. Found {', '.join(summary_parts)} related to your search."
@@ -214,25 +309,30 @@ class Graphon:
     @staticmethod
     async def sample(fraction: float = 0.05) -> SamplingResult:
         # Get real files
-        files = await client.list_files()
+        async with _api_sem:
+            files = await client.list_files()
         
         # Take a subset
         k = max(5, int(len(files) * fraction * 5)) # Multiply fraction for demo visibility
-        selected = random.sample(files, min(k, len(files)))
+        selected = _rng.choice(len(files), size=min(k, len(files)), replace=False)
         
-        nodes = [Graphon._file_to_node(f) for f in selected]
+        nodes = [Graphon._file_to_node(files[i]) for i in selected]
         
-        # Create mock edges to make it a graph
-        edges = []
-        for i, n in enumerate(nodes):
-             if i > 0 and random.random() > 0.6:
-                 target = nodes[random.randint(0, i-1)]
-                 edges.append(GraphEdge(
-                     source=n.id,
-                     target=target.id,
-                     weight=random.random(),
-                     relation="sampled_link"
-                 ))
+        # Create mock edges to make it a graph: each later node links back to an
+        # earlier one with probability 0.4, drawn for all nodes at once
+        idx = np.arange(1, len(nodes))
+        kept = idx[_rng.random(len(idx)) > 0.6]
+        targets = _rng.integers(0, kept)
+        weights = _rng.random(len(kept))
+        edges = [
+            GraphEdge(
+                source=nodes[i].id,
+                target=nodes[t].id,
+                weight=w,
+                relation="sampled_link"
+            )
+            for i, t, w in zip(kept.tolist(), targets.tolist(), weights.tolist())
+        ]
                  
         return SamplingResult(
             nodes=nodes,
@@ -244,18 +344,50 @@ class Graphon:
             }
         )
 
+    @staticmethod
+    async def _get_files_by_ids(file_ids: List[str]) -> List[Any]:
+        # The client has no group-scoped listing or public single-file getter, so look the
+        # files up one by one through _get_file_status (kept stable by the version pin).
+        # Deleted files (404) are skipped, like the old list_files() filter did; any other
+        # error fails the request.
+        sem = asyncio.Semaphore(FILE_FETCH_CONCURRENCY)
+
+        async def fetch_file(file_id: str) -> Any:
+            async with _api_sem:
+                try:
+                    return await client._get_file_status(file_id)
+                except Exception as e:
+                    if "(404)" in str(e):
+                        return None
+                    raise
+
+        # TaskGroups cancel the remaining lookups as soon as one fails; the first error
+        # is re-raised on its own so callers still see the client's message
+        async def fetch_chunk(chunk: List[str]) -> List[Any]:
+            async with sem:
+                try:
+                    async with asyncio.TaskGroup() as tg:
+                        tasks = [tg.create_task(fetch_file(file_id)) for file_id in chunk]
+                except ExceptionGroup as eg:
+                    raise eg.exceptions[0]
+                return [t.result() for t in tasks]
+
+        chunks = [file_ids[i:i + FILE_FETCH_CHUNK_SIZE] for i in range(0, len(file_ids), FILE_FETCH_CHUNK_SIZE)]
+        try:
+            async with asyncio.TaskGroup() as tg:
+                chunk_tasks = [tg.create_task(fetch_chunk(c)) for c in chunks]
+        except ExceptionGroup as eg:
+            raise eg.exceptions[0]
+        return [f for t in chunk_tasks for f in t.result() if f is not None]
+
     @staticmethod
     def _map_file_type(filename: str) -> str:
-        ext = filename.split('.')[-1].lower()
-        if ext in ['mp4', 'mov', 'webm']: return 'video'
-        if ext in ['mp3', 'wav', 'm4a']: return 'audio'
-        if ext in ['png', 'jpg', 'jpeg', 'svg']: return 'image'
-        if ext in ['pdf', 'doc', 'docx']: return 'doc'
-        return 'text'
+        return _EXT_MAP.get(filename.rpartition('.')[2].lower(), 'text')
 
     @staticmethod
     def _file_to_node(f: Any) -> GraphNode:
-        return GraphNode(
+        # Called per file in expand/sample on data straight from the client, so skip validation
+        return GraphNode.model_construct(
             id=f.file_id,
             label=f.file_name,
             type=Graphon._map_file_type(f.file_name),
@@ -1,19 +1,55 @@
 from dotenv import load_dotenv
 load_dotenv()
 
+from contextlib import asynccontextmanager
 from typing import List, Optional
+import asyncio
 import os
-import shutil
 import tempfile
 
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+import aiofiles
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Depends, Request
 from fastapi.middleware.cors import CORSMiddleware
-from pydantic import BaseModel
+from fastapi.responses import ORJSONResponse
+from pydantic import BaseModel, TypeAdapter
 from graphon_client.client import GraphonClient, FileDetail, GroupDetail, GroupListItem, QueryResponse
-from graphon_client.client import GraphonClient, FileDetail, GroupDetail, GroupListItem, QueryResponse
-from graphex import Graphon, RetrievalHit, ExpansionResult, SamplingResult, GraphNode, RetrievalResult
-
-app = FastAPI()
+import graphex
+from graphex import Graphon, RetrievalHit, ExpansionResult, SamplingResult, GraphNode
+
+__all__ = ["app", "get_client"]
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Endpoints and Graphon share graphex's client, so the process holds a single connection pool
+    global _trail_queue
+    app.state.client = graphex.startup()
+    await init_supabase()
+    trail_flusher = None
+    if supabase:
+        # Created here so the queue belongs to the loop serving this app
+        _trail_queue = asyncio.Queue()
+        trail_flusher = asyncio.create_task(_trail_flusher())
+    yield
+    unsaved_trails = 0
+    if trail_flusher:
+        # Let queued trails reach Supabase before shutting down, but don't hang on a stuck insert
+        try:
+            await asyncio.wait_for(_trail_queue.join(), TRAIL_SHUTDOWN_TIMEOUT)
+        except asyncio.TimeoutError:
+            pass
+        trail_flusher.cancel()
+        try:
+            await trail_flusher
+        except asyncio.CancelledError:
+            pass
+        unsaved_trails = _trail_queue.qsize()
+    await app.state.client.close()
+    if unsaved_trails:
+        # Fails the shutdown: these trails were acknowledged as queued but never written
+        raise RuntimeError(f"{unsaved_trails} queued trails were not saved before shutdown")
+
+# orjson encodes the large /files, /sample and /expand payloads much faster than json
+app = FastAPI(lifespan=lifespan, default_response_class=ORJSONResponse)
 
 # Enable CORS
 app.add_middleware(
@@ -36,7 +72,11 @@ BASE_URL = os.getenv("GRAPHON_API_URL", "http://localhost:8081") # Defaulting to
 # "https://api-frontend-485250924682.us-central1.run.app"
 # I should probably allow it to be configurable.
 
-client = GraphonClient(api_key=API_KEY)
+def get_client(request: Request) -> GraphonClient:
+    return request.app.state.client
+
+# Built once so /files dumps the whole list in a single pydantic-core call
+_FileListAdapter = TypeAdapter(List[FileDetail])
 
 # ============================================================================
 # Pydantic Models for Request Bodies
@@ -64,16 +104,20 @@ class ExpandRequest(BaseModel):
 # Endpoints
 # ============================================================================
 
-@app.get("/files", response_model=List[FileDetail])
-async def list_files():
+@app.get("/files")
+async def list_files(client: GraphonClient = Depends(get_client)):
     """List all files."""
     try:
-        return await client.list_files()
+        files = await client.list_files()
+        # Serialized here directly, skipping FastAPI's response_model re-validation pass
+        return ORJSONResponse(content=_FileListAdapter.dump_python(files, mode="json"))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
+UPLOAD_CHUNK_SIZE = 1 << 20
+
 @app.post("/files/upload")
-async def upload_file(files: List[UploadFile] = File(...)):
+async def upload_file(files: List[UploadFile] = File(...), client: GraphonClient = Depends(get_client)):
     """
     Upload and process multiple files.
     This handles the full flow:
@@ -88,8 +132,10 @@ async def upload_file(files: List[UploadFile] = File(...)):
             # Save all files to temp
             for file in files:
                 tmp_path = os.path.join(tmp_dir, file.filename)
-                with open(tmp_path, "wb") as buffer:
-                    shutil.copyfileobj(file.file, buffer)
+                # Copy in 1 MiB chunks without blocking the event loop
+                async with aiofiles.open(tmp_path, "wb") as buffer:
+                    while chunk := await file.read(UPLOAD_CHUNK_SIZE):
+                        await buffer.write(chunk)
                 temp_file_paths.append(tmp_path)
 
             try:
@@ -114,8 +160,8 @@ async def upload_file(files: List[UploadFile] = File(...)):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/groups", response_model=List[GroupListItem])
-async def list_groups():
+@app.get("/groups", response_model=List[GroupListItem], response_model_exclude_unset=True)
+async def list_groups(client: GraphonClient = Depends(get_client)):
     """List all groups."""
     try:
         # Note: client.list_groups returns List[GroupListItem]
@@ -124,27 +170,28 @@ async def list_groups():
         raise HTTPException(status_code=500, detail=str(e))
 
 @app.post("/groups")
-async def create_group(request: GroupCreateRequest):
+async def create_group(request: GroupCreateRequest, client: GraphonClient = Depends(get_client)):
     """Create a new group."""
     try:
         group_id = await client.create_group(
             file_ids=request.file_ids,
             group_name=request.group_name
         )
+        Graphon.reset_primary_group()
         return {"group_id": group_id}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/groups/{group_id}", response_model=GroupDetail)
-async def get_group(group_id: str):
+@app.get("/groups/{group_id}", response_model=GroupDetail, response_model_exclude_unset=True)
+async def get_group(group_id: str, client: GraphonClient = Depends(get_client)):
     """Get group details."""
     try:
         return await client.get_group_status(group_id)
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/groups/{group_id}/query", response_model=QueryResponse)
-async def query_group(group_id: str, request: QueryRequest):
+@app.post("/groups/{group_id}/query", response_model=QueryResponse, response_model_exclude_unset=True)
+async def query_group(group_id: str, request: QueryRequest, client: GraphonClient = Depends(get_client)):
     """Query a group."""
     try:
         return await client.query_group(
@@ -155,15 +202,16 @@ async def query_group(group_id: str, request: QueryRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/retrieve", response_model=RetrievalResult)
+@app.post("/retrieve")
 async def retrieve_content(request: RetrieveRequest):
     """Retrieve multimodal content based on query."""
     try:
-        return await Graphon.retrieve(request.query, request.modalities, request.group_id)
+        result = await Graphon.retrieve(request.query, request.modalities, request.group_id)
+        return ORJSONResponse(content=result.model_dump(mode="json"))
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.post("/expand", response_model=ExpansionResult)
+@app.post("/expand", response_model=ExpansionResult, response_model_exclude_unset=True)
 async def expand_graph(request: ExpandRequest):
     """Expand the graph from seed nodes."""
     try:
@@ -171,7 +219,7 @@ async def expand_graph(request: ExpandRequest):
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
 
-@app.get("/sample", response_model=SamplingResult)
+@app.get("/sample", response_model=SamplingResult, response_model_exclude_unset=True)
 async def sample_graph():
     """Sample a sparse subgraph for training/eval."""
     try:
@@ -183,17 +231,67 @@ async def sample_graph():
 # Supabase / Trails Endpoints
 # ============================================================================
 
-from supabase import create_client, Client
+from supabase import acreate_client, AsyncClient
 
 SUPABASE_URL = os.getenv("SUPABASE_URL")
 SUPABASE_KEY = os.getenv("SUPABASE_KEY")
 
-supabase: Optional[Client] = None
-if SUPABASE_URL and SUPABASE_KEY:
+# Async client so trail queries don't block the event loop; created in lifespan
+supabase: Optional[AsyncClient] = None
+
+async def init_supabase():
+    global supabase
+    if SUPABASE_URL and SUPABASE_KEY:
+        try:
+            supabase = await acreate_client(SUPABASE_URL, SUPABASE_KEY)
+        except Exception as e:
+            print(f"Warning: Failed to initialize Supabase client: {e}")
+
+# Trails are written in batches: one insert per 500ms or per 50 trails, whichever comes first
+TRAIL_FLUSH_INTERVAL = 0.5
+TRAIL_BATCH_SIZE = 50
+TRAIL_SHUTDOWN_TIMEOUT = 5.0
+_trail_queue: "Optional[asyncio.Queue[dict]]" = None
+
+async def _insert_trails(batch: List[dict]):
     try:
-        supabase = create_client(SUPABASE_URL, SUPABASE_KEY)
+        await supabase.table("trails").insert(batch).execute()
+        return
     except Exception as e:
-        print(f"Warning: Failed to initialize Supabase client: {e}")
+        if len(batch) == 1:
+            print(f"Error creating trail: {e}")
+            return
+        print(f"Error creating trails batch, retrying one by one: {e}")
+    # One bad row fails the whole batch insert; retrying row by row loses only that row
+    for row in batch:
+        try:
+            await supabase.table("trails").insert(row).execute()
+        except Exception as e:
+            print(f"Error creating trail: {e}")
+
+async def _trail_flusher():
+    loop = asyncio.get_running_loop()
+    while True:
+        batch = []
+        try:
+            batch.append(await _trail_queue.get())
+            deadline = loop.time() + TRAIL_FLUSH_INTERVAL
+            while len(batch) < TRAIL_BATCH_SIZE:
+                remaining = deadline - loop.time()
+                if remaining <= 0:
+                    break
+                try:
+                    batch.append(await asyncio.wait_for(_trail_queue.get(), remaining))
+                except asyncio.TimeoutError:
+                    break
+            await _insert_trails(batch)
+        except asyncio.CancelledError:
+            # Cancelled at shutdown: put unsaved trails back so lifespan can count them
+            for row in batch:
+                _trail_queue.put_nowait(row)
+            raise
+        for _ in batch:
+            _trail_queue.task_done()
 
 class Trail(BaseModel):
     id: str
@@ -209,14 +307,14 @@ class CreateTrailRequest(BaseModel):
     nodes: Optional[List[dict]] = None
     edges: Optional[List[dict]] = None
 
-@app.get("/trails", response_model=List[Trail])
+@app.get("/trails", response_model=List[Trail], response_model_exclude_unset=True)
 async def get_trails():
     """Get recent trails from Supabase."""
     if not supabase:
         # Fallback if unconfigured
         return []
     try:
-        response = supabase.table("trails").select("*").order("created_at", desc=True).limit(20).execute()
+        response = await supabase.table("trails").select("*").order("created_at", desc=True).limit(20).execute()
         return response.data
     except Exception as e:
         print(f"Error fetching trails: {e}")
@@ -224,23 +322,19 @@ async def get_trails():
 
 @app.post("/trails")
 async def create_trail(request: CreateTrailRequest):
-    """Save a new trail."""
+    """Queue a new trail; it is saved with the next batch insert."""
     if not supabase:
         return {"status": "skipped", "reason": "supabase_not_configured"}
-    try:
-        # Check if exists to avoid dupes (optional, but good for UX)
-        # For now just insert
-        data = {
-            "query": request.query,
-            "synthesis": request.synthesis,
-            "nodes": request.nodes,
-            "edges": request.edges
-        }
-        response = supabase.table("trails").insert(data).execute()
-        return response.data
-    except Exception as e:
-        print(f"Error creating trail: {e}")
-        raise HTTPException(status_code=500, detail=str(e))
+    # Check if exists to avoid dupes (optional, but good for UX)
+    # For now just insert
+    data = {
+        "query": request.query,
+        "synthesis": request.synthesis,
+        "nodes": request.nodes,
+        "edges": request.edges
+    }
+    await _trail_queue.put(data)
+    return {"status": "queued"}
 
 @app.delete("/trails/{trail_id}")
 async def delete_trail(trail_id: str):
@@ -248,12 +342,8 @@ async def delete_trail(trail_id: str):
     if not supabase:
          return {"status": "skipped"}
     try:
-        supabase.table("trails").delete().eq("id", trail_id).execute()
+        await supabase.table("trails").delete().eq("id", trail_id).execute()
         return {"status": "success"}
     except Exception as e:
         print(f"Error deleting trail: {e}")
         raise HTTPException(status_code=500, detail=str(e))
-
-if __name__ == "__main__":
-    import uvicorn
-    uvicorn.run(app, host="0.0.0.0", port=8000)
\ No newline at end of file
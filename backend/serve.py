@@ -0,0 +1,22 @@
+import os
+import sys
+from dotenv import load_dotenv
+import uvicorn
+
+load_dotenv()
+
+# Production entry point: `python serve.py` (run from backend/).
+# graphon is only imported by uvicorn through the "graphon:app" string, so each worker
+# process loads it exactly once and gets its own client, caches and trail queue.
+# Equivalent CLI: uvicorn graphon:app --host 0.0.0.0 --port 8000 --loop uvloop --http httptools --workers N
+
+if __name__ == "__main__":
+    uvicorn.run(
+        "graphon:app",
+        host="0.0.0.0",
+        port=8000,
+        # uvloop has no Windows build
+        loop="asyncio" if sys.platform == "win32" else "uvloop",
+        http="httptools",
+        workers=int(os.getenv("GRAPHON_WORKERS", os.cpu_count() or 1)),
+    )
@@ -10,43 +10,44 @@ async def verify():
         # Actually easier to just call the function if I can get it, but decorators wrap it.
         # Let's just import the function if possible, or use TestClient.
         from starlette.testclient import TestClient
-        client = TestClient(app)
+        # The context manager runs the app's lifespan, which builds the shared client
+        with TestClient(app) as client:
         
-        response = client.post("/retrieve", json={"query": "churn story", "modalities": ["video", "text"]})
-        if response.status_code == 200:
-            print("✅ /retrieve success")
-            data = response.json()
-            print(f"   Got {len(data)} hits")
-            if data:
-                print(f"   Sample hit: {data[0]['node']['label']} ({data[0]['node']['type']})")
-                seed_id = data[0]['node']['id']
+            response = client.post("/retrieve", json={"query": "churn story", "modalities": ["video", "text"]})
+            if response.status_code == 200:
+                print("✅ /retrieve success")
+                data = response.json()
+                print(f"   Got {len(data)} hits")
+                if data:
+                    print(f"   Sample hit: {data[0]['node']['label']} ({data[0]['node']['type']})")
+                    seed_id = data[0]['node']['id']
+                else:
+                    print("   ⚠️ No hits found (Graph might be empty). Skipping expand test with specific seed.")
+                    seed_id = "test-seed-id"
             else:
-                print("   ⚠️ No hits found (Graph might be empty). Skipping expand test with specific seed.")
-                seed_id = "test-seed-id"
-        else:
-            print(f"❌ /retrieve failed: {response.text}")
-            seed_id = None
+                print(f"❌ /retrieve failed: {response.text}")
+                seed_id = None
 
-        print("\nVerifying /expand...")
-        # Test Expand
-        if seed_id:
-            response = client.post("/expand", json={"seed_ids": [seed_id]})
+            print("\nVerifying /expand...")
+            # Test Expand
+            if seed_id:
+                response = client.post("/expand", json={"seed_ids": [seed_id]})
+                if response.status_code == 200:
+                    print("✅ /expand success")
+                    data = response.json()
+                    print(f"   Nodes: {len(data['nodes'])}, Edges: {len(data['edges'])}")
+                    print(f"   Summary: {data['summary']}")
+                else:
+                     print(f"❌ /expand failed: {response.text}")
+                
+            print("\nVerifying /sample...")
+            response = client.get("/sample")
             if response.status_code == 200:
-                print("✅ /expand success")
+                print("✅ /sample success")
                 data = response.json()
-                print(f"   Nodes: {len(data['nodes'])}, Edges: {len(data['edges'])}")
-                print(f"   Summary: {data['summary']}")
+                print(f"   Stats: {data['stats']}")
             else:
-                 print(f"❌ /expand failed: {response.text}")
-                
-        print("\nVerifying /sample...")
-        response = client.get("/sample")
-        if response.status_code == 200:
-            print("✅ /sample success")
-            data = response.json()
-            print(f"   Stats: {data['stats']}")
-        else:
-            print(f"❌ /sample failed: {response.text}")
+                print(f"❌ /sample failed: {response.text}")
 
     except Exception as e:
         print(f"❌ Verification crashed: {e}")
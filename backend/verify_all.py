@@ -25,7 +25,7 @@ async def main():
         groups = await client.list_groups()
         print(f"Groups: {len(groups)}")
         for g in groups:
-            print(f"  {g.group_name} ({g.graph_status})")
+            print(f"  {g.group_name} ({g.status})")
             
         print("\nALL CHECKS PASSED")
 
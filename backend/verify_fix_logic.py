@@ -1,26 +1,40 @@
 
 import asyncio
+import functools
 import os
 import sys
+import aiofiles
+import aiofiles.os
 from dotenv import load_dotenv
 
-sys.path.append(os.getcwd())
+# Resolved once; the guard keeps sys.path from growing if this module is re-imported
+_CWD = os.getcwd()
+if _CWD not in sys.path:
+    sys.path.append(_CWD)
 
 from graphon_client.client import GraphonClient
 
-load_dotenv()
+@functools.cache
+def _api_key():
+    load_dotenv()
+    return os.getenv("GRAPHON_API_KEY")
 
-API_KEY = os.getenv("GRAPHON_API_KEY")
+@functools.cache
+def get_client():
+    # Shared by every main() run in this process, so warm runs reuse its open connections
+    return GraphonClient(api_key=_api_key())
+
+async def _ensure_dummy(path):
+    if not await aiofiles.os.path.exists(path):
+        async with aiofiles.open(path, "w") as f:
+            await f.write("Test content for fix verification")
 
 async def main():
+    client = get_client()
     try:
-        client = GraphonClient(api_key=API_KEY)
-        
         # Create a dummy file
-        file_path = os.path.join(os.getcwd(), "dummy_fix_verify.txt")
-        if not os.path.exists(file_path):
-             with open(file_path, "w") as f:
-                 f.write("Test content for fix verification")
+        file_path = os.path.join(_CWD, "dummy_fix_verify.txt")
+        await _ensure_dummy(file_path)
 
         print(f"Uploading {file_path} with poll_until_complete=TRUE...")
         # This is the proposed fix: waiting for completion
@@ -33,11 +47,12 @@ async def main():
             print("Upload failed or returned empty.")
             return
 
-        file_id = upload_results[0].file_id
-        status = upload_results[0].processing_status
-        print(f"Uploaded file ID: {file_id}, Status: {status}")
+        # Every file must be processed before any of them can be grouped
+        file_ids = [r.file_id for r in upload_results]
+        for r in upload_results:
+            print(f"Uploaded file ID: {r.file_id}, Status: {r.processing_status}")
         
-        if status != "SUCCESS":
+        if any(r.processing_status != "SUCCESS" for r in upload_results):
             print("❌ Verification Failed: Status is not SUCCESS after polling.")
             return
 
@@ -45,7 +60,7 @@ async def main():
         print("Attempting to create group 'verify_fix_group' immediately...")
         try:
             group_id = await client.create_group(
-                file_ids=[file_id],
+                file_ids=file_ids,
                 group_name="verify_fix_group"
             )
             print(f"✅ Success! Group created with ID: {group_id}")
@@ -58,5 +73,14 @@ async def main():
         import traceback
         traceback.print_exc()
 
+async def _run():
+    # Closed on the loop that used it; the pool can't be shut down from a fresh loop at exit
+    try:
+        async with get_client():
+            await main()
+    finally:
+        # A closed client can't be reused, so the next get_client() builds a fresh one
+        get_client.cache_clear()
+
 if __name__ == "__main__":
-    asyncio.run(main())
+    asyncio.run(_run())